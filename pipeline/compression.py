@@ -0,0 +1,144 @@
+# compression.py
+
+# Compresses downloaded bhavcopies for the runners: gzip (.csv.gz, through pigz when it is installed)
+# or zstd (.csv.zst, needs the zstandard package). Both runners write their outputs through here,
+# so an output is always complete once it has its final name and existing_output can trust it.
+
+import os
+import gzip
+import shutil
+import subprocess
+import logging
+from pathlib import Path
+from typing import BinaryIO, Union
+
+try:
+    import zstandard
+except ImportError:  # optional, only needed for COMPRESSION = "zstd"
+    zstandard = None
+
+COMPRESSION = "gzip"  # "gzip" (.csv.gz) or "zstd" (.csv.zst, needs the zstandard package)
+WHOLE_READ_LIMIT = 64 * 1024 * 1024  # files below this size are compressed in one write
+PIGZ = shutil.which("pigz")  # multi-threaded gzip, used instead of the gzip module when installed
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_codec(codec: str) -> str:
+    """
+    Returns the codec to actually use, falling back to gzip when zstandard is not installed.
+    """
+    if codec == "zstd" and zstandard is None:
+        logger.warning("zstandard is not installed, falling back to gzip")
+        return "gzip"
+    return codec
+
+
+def compressed_path(csv_path: Path, codec: str) -> Path:
+    """
+    Returns the path csv_path is saved under when compressed with codec.
+    """
+    return Path(csv_path).with_suffix(".csv.zst" if codec == "zstd" else ".csv.gz")
+
+
+def existing_output(csv_path: Path) -> Union[Path, None]:
+    """
+    Returns the compressed output (.csv.gz or .csv.zst) already saved for csv_path, if any.
+    Outputs are only ever renamed into place once complete, so an existing non-empty file is whole.
+
+    :param csv_path: The path of the uncompressed CSV.
+    :return: Path to the compressed file, or None if it has not been downloaded yet.
+    """
+    for out_path in (compressed_path(csv_path, "gzip"), compressed_path(csv_path, "zstd")):
+        if out_path.exists() and out_path.stat().st_size > 0:
+            return out_path
+    return None
+
+
+def _copy_stream(f_in: BinaryIO, f_out: BinaryIO, size: Union[int, None] = None):
+    """
+    Copies f_in into f_out. Inputs known to be smaller than WHOLE_READ_LIMIT are passed to the
+    compressor in a single write; anything else is streamed in 1 MiB chunks.
+    """
+    if size is not None and size < WHOLE_READ_LIMIT:
+        f_out.write(f_in.read())
+    else:
+        shutil.copyfileobj(f_in, f_out, length=1024 * 1024)
+
+
+def _zstd_threads(threads: Union[int, None]) -> int:
+    """
+    Maps a thread count to zstandard's convention: -1 is every core, 0 is single-threaded.
+    """
+    if threads is None:
+        return -1
+    return threads if threads > 1 else 0
+
+
+def write_compressed(f_in: BinaryIO, out_path: Path, codec: str, level: int, size: Union[int, None] = None,
+                     threads: Union[int, None] = None):
+    """
+    Copies a binary stream of the given size (if known) into out_path, compressed with the given codec.
+    gzip output is produced by pigz when it is on the PATH and more than one thread is allowed,
+    else by the gzip module.
+    The data is written to a .part file first, so only a complete file ever gets the final name.
+    """
+    tmp_path = out_path.with_name(out_path.name + ".part")
+    try:
+        if codec == "zstd":
+            cctx = zstandard.ZstdCompressor(level=10, threads=_zstd_threads(threads))
+            with open(tmp_path, 'wb') as raw, cctx.stream_writer(raw) as f_out:
+                _copy_stream(f_in, f_out, size)
+        elif PIGZ is not None and threads != 1:
+            # pigz splits the deflate work across cores, also within a single file
+            with open(tmp_path, 'wb') as raw:
+                proc = subprocess.Popen([PIGZ, f"-{level}", "-p", str(threads or os.cpu_count()), "-c"],
+                                        stdin=subprocess.PIPE, stdout=raw)
+                try:
+                    with proc.stdin:
+                        shutil.copyfileobj(f_in, proc.stdin, length=1024 * 1024)
+                finally:
+                    # Always reap pigz, also when it died mid-copy (BrokenPipeError)
+                    returncode = proc.wait()
+                if returncode != 0:
+                    raise subprocess.CalledProcessError(returncode, proc.args)
+        else:
+            with gzip.open(tmp_path, 'wb', compresslevel=level) as f_out:
+                # Copy the contents from the input stream to the gzipped output file
+                _copy_stream(f_in, f_out, size)
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def compress_file(input_file_path, codec: str = COMPRESSION, level: int = 6, threads: Union[int, None] = None):
+    """
+    Compresses a given file to a .csv.gz (gzip) or .csv.zst (zstd) format.
+    The compressed file will have the same name but with the codec's extension in the same directory.
+    Falls back to gzip when zstd is requested but the zstandard package is not installed.
+
+    :parm input_file_path (str or Path): The path to the file you want to compress.
+    :param codec: "gzip" or "zstd"
+    :param level: gzip compression level; 6 is nearly as small as 9 on CSVs at a fraction of the CPU
+    :param threads: Compressor threads; None uses every core. Pass 1 when already running one compression per core.
+    :return bool
+    """
+    # Ensure the input_file_path is a Path object for easier manipulation
+    input_path = Path(input_file_path)
+    codec = resolve_codec(codec)
+    out_path = compressed_path(input_path, codec)
+
+    try:
+        # Open the input file in binary read mode ('rb')
+        with open(input_path, 'rb') as f_in:
+            write_compressed(f_in, out_path, codec, level, input_path.stat().st_size, threads)
+        # Optionally remove the uncompressed CSV
+        input_path.unlink()  # deletes original .csv file
+        logger.info("Successfully compressed '%s' to '%s'", input_path.name, out_path.name)
+        return True
+    except FileNotFoundError:
+        logger.error("Error: Input file not found at '%s'", input_path)
+    except Exception as e:
+        logger.error("An error occurred during compression: %s", e)
+    return False
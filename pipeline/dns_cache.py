@@ -0,0 +1,55 @@
+# dns_cache.py
+
+# Caches DNS lookups of selected hosts for the requests/urllib3 sessions of the runners.
+# urllib3 resolves the host on every new connection; for the exchange hosts the address is
+# reused for a TTL instead. The patch is process-wide, so it is installed at most once and
+# every runner only registers its hosts.
+
+import socket
+import time
+from urllib3.util import connection as urllib3_connection
+
+_ttls = {}  # host -> seconds a resolved address is reused
+_cache = {}  # (host, port) -> (resolved_at, [address, ...])
+_create_connection = urllib3_connection.create_connection
+
+
+def _create_connection_cached(address, *args, **kwargs):
+    """
+    Drop-in for urllib3's create_connection that reuses resolved addresses of registered hosts.
+    Like the original, every address of the host is tried in turn until one connects.
+    TLS still verifies against the hostname, which urllib3 passes separately.
+    """
+    host, port = address
+    if host not in _ttls:
+        return _create_connection(address, *args, **kwargs)
+
+    cached = _cache.get((host, port))
+    if cached is None or time.time() - cached[0] >= _ttls[host]:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        cached = (time.time(), list(dict.fromkeys(info[4][0] for info in infos)))
+        _cache[(host, port)] = cached
+
+    error = None
+    for ip in cached[1]:
+        try:
+            return _create_connection((ip, port), *args, **kwargs)
+        except OSError as e:
+            error = e
+    # None of the cached addresses works (the host may have moved): resolve again next time
+    _cache.pop((host, port), None)
+    raise error
+
+
+def install(hosts, ttl: float):
+    """
+    Caches DNS lookups of the given hosts for ttl seconds. Safe to call from several modules:
+    urllib3 is only patched once, later calls just register more hosts.
+
+    :param hosts: Hostnames whose lookups are cached.
+    :param ttl: Seconds a resolved address is reused.
+    """
+    for host in hosts:
+        _ttls[host] = ttl
+    if urllib3_connection.create_connection is not _create_connection_cached:
+        urllib3_connection.create_connection = _create_connection_cached
@@ -0,0 +1,75 @@
+# market_holidays.py
+
+# Weekday trading holidays for the Indian equity segment. NSE and BSE publish the same list.
+# Diwali Laxmi Pujan is intentionally left out: the exchanges hold a Muhurat trading session
+# that day and a bhavcopy is published for it.
+# Years outside FIRST_LISTED_YEAR..LAST_LISTED_YEAR fall back to plain Mon–Fri business days;
+# the range runners warn when asked for them.
+
+TRADING_HOLIDAYS_2024 = [
+    "2024-01-22",  # Special holiday
+    "2024-01-26",  # Republic Day
+    "2024-03-08",  # Mahashivratri
+    "2024-03-25",  # Holi
+    "2024-03-29",  # Good Friday
+    "2024-04-11",  # Id-Ul-Fitr (Ramadan)
+    "2024-04-17",  # Shri Ram Navmi
+    "2024-05-01",  # Maharashtra Day
+    "2024-05-20",  # General Parliamentary Elections
+    "2024-06-17",  # Bakri Id
+    "2024-07-17",  # Moharram
+    "2024-08-15",  # Independence Day
+    "2024-10-02",  # Mahatma Gandhi Jayanti
+    "2024-11-15",  # Gurunanak Jayanti
+    "2024-11-20",  # Maharashtra Assembly Elections
+    "2024-12-25",  # Christmas
+]
+
+TRADING_HOLIDAYS_2025 = [
+    "2025-02-26",  # Mahashivratri
+    "2025-03-14",  # Holi
+    "2025-03-31",  # Id-Ul-Fitr (Ramadan)
+    "2025-04-10",  # Shri Mahavir Jayanti
+    "2025-04-14",  # Dr. Baba Saheb Ambedkar Jayanti
+    "2025-04-18",  # Good Friday
+    "2025-05-01",  # Maharashtra Day
+    "2025-08-15",  # Independence Day
+    "2025-08-27",  # Ganesh Chaturthi
+    "2025-10-02",  # Mahatma Gandhi Jayanti / Dussehra
+    "2025-10-22",  # Diwali Balipratipada
+    "2025-11-05",  # Prakash Gurpurb Sri Guru Nanak Dev
+    "2025-12-25",  # Christmas
+]
+
+TRADING_HOLIDAYS_2026 = [
+    "2026-01-15",  # Municipal Corporation Elections (Maharashtra)
+    "2026-01-26",  # Republic Day
+    "2026-03-03",  # Holi
+    "2026-03-26",  # Shri Ram Navami
+    "2026-03-31",  # Shri Mahavir Jayanti
+    "2026-04-03",  # Good Friday
+    "2026-04-14",  # Dr. Baba Saheb Ambedkar Jayanti
+    "2026-05-01",  # Maharashtra Day
+    "2026-05-28",  # Bakri Id
+    "2026-06-26",  # Muharram
+    "2026-09-14",  # Ganesh Chaturthi
+    "2026-10-02",  # Mahatma Gandhi Jayanti
+    "2026-10-20",  # Dussehra
+    "2026-11-10",  # Diwali Balipratipada
+    "2026-11-24",  # Prakash Gurpurb Sri Guru Nanak Dev
+    "2026-12-25",  # Christmas
+]
+
+TRADING_HOLIDAYS = TRADING_HOLIDAYS_2024 + TRADING_HOLIDAYS_2025 + TRADING_HOLIDAYS_2026
+FIRST_LISTED_YEAR = 2024
+LAST_LISTED_YEAR = 2026
+
+# Weekend days on which the exchanges held a trading session and published a bhavcopy.
+# Mon–Fri calendars never produce these, so the range runners add them explicitly.
+SPECIAL_SESSIONS = [
+    "2024-01-20",  # Saturday, full session in lieu of 22-Jan
+    "2024-03-02",  # Saturday, live session from the DR site
+    "2024-05-18",  # Saturday, live session from the DR site
+    "2025-02-01",  # Saturday, Union Budget
+    "2026-02-01",  # Sunday, Union Budget
+]
@@ -0,0 +1,50 @@
+# retries.py
+
+# Retry policy shared by the runners. The requests sessions of the single-date downloads retry through
+# urllib3 (retry_adapter); the httpx range downloads run their own loop with the same limits and delays.
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+MAX_RETRIES = 5  # per request, for connection errors and RETRY_STATUSES
+BACKOFF_FACTOR = 1.0  # seconds, doubled on each retry unless the server sends Retry-After
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+
+def retry_adapter(**kwargs) -> HTTPAdapter:
+    """
+    Returns an HTTPAdapter that retries GETs on connection errors and RETRY_STATUSES,
+    honouring Retry-After.
+
+    :param kwargs: Passed on to HTTPAdapter (e.g. pool_connections, pool_maxsize).
+    """
+    return HTTPAdapter(
+        max_retries=Retry(
+            total=MAX_RETRIES,
+            backoff_factor=BACKOFF_FACTOR,
+            status_forcelist=RETRY_STATUSES,
+            respect_retry_after_header=True,
+            allowed_methods=["GET"],
+        ),
+        **kwargs,
+    )
+
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Seconds to wait before retry number attempt + 1 when the server gave no hint.
+    """
+    return BACKOFF_FACTOR * 2 ** attempt
+
+
+def retry_delay(response, attempt: int) -> float:
+    """
+    Seconds to wait before retrying: the server's Retry-After if it sent one, else exponential backoff.
+
+    :param response: The httpx (or requests) response that asked for a retry.
+    :param attempt: Number of retries made so far.
+    """
+    retry_after = response.headers.get("Retry-After", "")
+    if retry_after.isdigit():
+        return float(retry_after)
+    return backoff_delay(attempt)
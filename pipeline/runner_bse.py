@@ -1,16 +1,39 @@
 #!/usr/bin/python3
 
 import os
-import shutil
-import gzip
+import functools
+import asyncio
+import logging
+import aiofiles
+import httpx
 import requests
+import pandas as pd
+from urllib.parse import urlsplit
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import datetime
+from pandas.tseries.offsets import CustomBusinessDay
+from market_holidays import TRADING_HOLIDAYS, FIRST_LISTED_YEAR, LAST_LISTED_YEAR, SPECIAL_SESSIONS
+import dns_cache
+from compression import compress_file, existing_output
+from retries import MAX_RETRIES, RETRY_STATUSES, retry_adapter, retry_delay, backoff_delay
 from typing import Union
 
+try:
+    import h2  # noqa: F401  enables HTTP/2 in httpx
+except ImportError:  # optional, downloads fall back to HTTP/1.1
+    h2 = None
+
 BASE_URL = "https://www.bseindia.com/download/BhavCopy"
 output_dir = "../data/bse/equity/bse"
 TIMEOUT = 20  # seconds
+MAX_CONCURRENT = 10  # parallel downloads in download_bhavcopy_range
+DNS_TTL = 60 * 60  # seconds a resolved exchange address is reused
+DNS_HOSTS = {urlsplit(BASE_URL).hostname}  # hosts whose DNS lookups are cached
+CSV_HEADER = b"TradDt,"  # first column of every bhavcopy CSV
+UTF8_BOM = b"\xef\xbb\xbf"
+
+logger = logging.getLogger(__name__)
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0",
@@ -19,123 +42,242 @@ HEADERS = {
     "Referer": "https://www.nseindia.com"
 }
 
+# Exchange hosts are resolved once per DNS_TTL instead of on every new connection
+dns_cache.install(DNS_HOSTS, DNS_TTL)
 
-def download_file(url: str, dest_path: Path, headers=HEADERS):
-    try:
-        response = requests.get(url, headers=HEADERS, timeout=TIMEOUT)
-        if response.status_code == 200:
-            with open(dest_path, "wb") as f:
-                f.write(response.content)
-            print(f"✅ Downloaded: {dest_path}")
-            return dest_path
-        else:
-            raise Exception(f"HTTP {response.status_code}")
-    except Exception as e:
-        print(f"❌ Failed for {url}: {e}")
-        return None
+# Shared session so consecutive downloads reuse the same keep-alive connection to bseindia.com
+_SESSION = requests.Session()
+_SESSION.headers.update(HEADERS)
+_ADAPTER = retry_adapter(pool_connections=4, pool_maxsize=16)
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
 
 
-def compress_file(input_file_path):
+def _check_bhavcopy(url: str, content_type: str, first: bytes):
     """
-    Compresses a given file to a .csv.gz format. 
-    The compressed file will have the same name but with a .csv.gz extension in the same directory.
+    Checks the start of a response before it is saved as a bhavcopy.
 
-    :parm input_file_path (str or Path): The path to the file you want to compress.
-    :return bool                                   
+    :raises RuntimeError: If the response is an HTML page, which indicates the file was not found,
+        or does not start with the bhavcopy CSV header.
     """
-    # Ensure the input_file_path is a Path object for easier manipulation
-    input_path = Path(input_file_path)
+    if "text/html" in content_type:
+        raise RuntimeError(f"BSE file not available or invalid URL: {url}")
+    if not first.lstrip(UTF8_BOM).startswith(CSV_HEADER):
+        raise RuntimeError(f"Not a bhavcopy CSV: {url} starts with {first[:16]!r}")
 
-    # Construct the path for the gzipped file.
-    # It will have the original name with a .csv.gz suffix.
-    gz_path = input_path.with_suffix(".csv.gz")
 
+def download_file(url: str, dest_path: Path, session: requests.Session = _SESSION):
+    """
+    Downloads a file to dest_path. The body is streamed into a .part file that is only renamed
+    to dest_path once complete, so a failed or interrupted download never leaves a partial file.
+    Error pages and other bodies that are not a bhavcopy CSV are rejected before anything is written.
+
+    :return: dest_path, or None if the download failed.
+    """
+    tmp_path = dest_path.with_name(dest_path.name + ".part")
     try:
-        # Open the input file in binary read mode ('rb')
-        # Open the output gzip file in binary write mode ('wb')
-        with open(input_path, 'rb') as f_in, gzip.open(gz_path, 'wb') as f_out:
-            # Copy the contents from the input file to the gzipped output file
-            shutil.copyfileobj(f_in, f_out)
-        # Optionally remove the uncompressed CSV
-        input_file_path.unlink()  # deletes original .csv file
-        print(f"Successfully compressed '{input_path.name}' to '{gz_path.name}'")
-        return True
-    except FileNotFoundError:
-        print(f"Error: Input file not found at '{input_path}'")
+        response = session.get(url, stream=True, timeout=TIMEOUT)
+        response.raise_for_status()
+        chunks = response.iter_content(chunk_size=1024 * 1024)
+        first = next(chunks, b"")
+        _check_bhavcopy(url, response.headers.get("Content-Type", ""), first)
+        with open(tmp_path, "wb") as f:
+            f.write(first)
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp_path, dest_path)
+        logger.info("✅ Downloaded: %s", dest_path)
+        return dest_path
     except Exception as e:
-        print(f"An error occurred during compression: {e}")
+        tmp_path.unlink(missing_ok=True)
+        logger.error("❌ Failed for %s: %s", url, e)
+        return None
+
+
+def _bhavcopy_url(ymd: str) -> str:
+    """Download URL of the bhavcopy for a date formatted as YYYYMMDD."""
+    return f"{BASE_URL}/Equity/BhavCopy_BSE_CM_0_0_0_{ymd}_F_0000.CSV"
 
 
-def download_bse_equity_bhavcopy(date_str: str, output_dir: Union[str, Path]) -> Path:
+def _output_path(output_dir: Path, ymd: str) -> Path:
+    """Uncompressed CSV path for a date formatted as YYYYMMDD; the saved file is this path plus .gz or .zst."""
+    return output_dir / f"{ymd}.csv"
+
+
+def download_bse_equity_bhavcopy(date_str: str, output_dir: Union[str, Path]) -> Union[Path, None]:
     """
-    Download and extract NSE equity bhavcopy for a given date.
+    Download and extract BSE equity bhavcopy for a given date.
     :param date_str: Format ddMMMyyyy (e.g., 05AUG2024)
     :param output_dir: Folder to save the extracted CSV
-    :return: Path to extracted CSV file
+    :return: Path to extracted CSV file, or None if the download failed
     """
     date_obj = datetime.strptime(date_str.upper(), "%d%b%Y")
+    return download_bse_equity_bhavcopy_for_date(date_obj, output_dir)
+
 
+def download_bse_equity_bhavcopy_for_date(date_obj: datetime, output_dir: Union[str, Path]) -> Union[Path, None]:
+    """
+    Same as download_bse_equity_bhavcopy, for a date that is already parsed.
+    :param date_obj: The trading date
+    :param output_dir: Folder to save the extracted CSV
+    :return: Path to extracted CSV file, or None if the download failed
+    """
     # Ensure output folder
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
     
    
     # Download URL and destination
-    url = f"{BASE_URL}/Equity/BhavCopy_BSE_CM_0_0_0_{date_obj:%Y%m%d}_F_0000.CSV"
-    output_dir = Path(output_dir)
-    file_path = output_dir / f"{date_obj:%d%b%Y}.csv"
-    
-    # Download and extract
-    download_file(url, file_path)
-    
-    # Rename file
-    # final_filename = date_obj.strftime("%d%b%Y").upper() + ".csv"
-    final_filename = date_obj.strftime("%Y%m%d") + ".csv"
-    final_path = output_dir / final_filename
+    ymd = date_obj.strftime("%Y%m%d")
+    url = _bhavcopy_url(ymd)
+    final_path = _output_path(output_dir, ymd)
+
+    # Nothing to do if this date was already saved by an earlier run
+    if existing_output(final_path) is not None:
+        logger.info("⏭️ Already downloaded: %s", final_path)
+        return final_path
+
+    # Download
+    if download_file(url, final_path) is None:
+        return None
     
     # Compress the file to .csv.gz to save space
-    compress_file(final_path)
+    if not compress_file(final_path):
+        return None
     
-    print(f"✅ Extracted file saved at: {final_path}.gz")
+    logger.info("✅ Extracted file saved at: %s", existing_output(final_path))
     return final_path
 
 
-def download_bhavcopy_range(start_date: str, end_date: str, output_dir: Union[str, Path]) -> list:
+async def _fetch(sem: asyncio.Semaphore, client: httpx.AsyncClient, url: str, dest_path: Path) -> Path:
+    """
+    Downloads a single file, holding a slot of the semaphore while the request is in flight.
+
+    :param sem: Semaphore bounding the number of concurrent requests.
+    :param client: Shared httpx client (one multiplexed connection for the whole range).
+    :param url: The URL of the file to download.
+    :param dest_path: The local path where the downloaded file will be saved.
+    :return: dest_path once the file is fully written.
+    :raises httpx.HTTPStatusError: If the request still fails after MAX_RETRIES retries.
+    :raises RuntimeError: If the response is an HTML page or otherwise not a bhavcopy CSV.
+    """
+    # Written to a .part file first, so an interrupted body never shows up as dest_path
+    tmp_path = dest_path.with_name(dest_path.name + ".part")
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            async with sem, client.stream("GET", url) as response:
+                if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                    response.raise_for_status()
+                    chunks = response.aiter_bytes(1024 * 1024)
+                    first = await anext(chunks, b"")
+                    _check_bhavcopy(url, response.headers.get("Content-Type", ""), first)
+                    async with aiofiles.open(tmp_path, "wb") as f:
+                        await f.write(first)
+                        async for chunk in chunks:
+                            await f.write(chunk)
+                    os.replace(tmp_path, dest_path)
+                    return dest_path
+                delay = retry_delay(response, attempt)
+        except httpx.TransportError:
+            tmp_path.unlink(missing_ok=True)
+            if attempt == MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt)
+        # Wait outside the semaphore so other dates can use the slot meanwhile
+        await asyncio.sleep(delay)
+
+
+async def _download_date(sem: asyncio.Semaphore, client: httpx.AsyncClient, pool: ProcessPoolExecutor,
+                         date_obj: datetime, ymd: str, output_dir: Path) -> Union[Path, None]:
+    """
+    Downloads and compresses the bhavcopy for one date. Failures are reported and swallowed
+    so that one missing day does not abort the whole range.
+    """
+    url = _bhavcopy_url(ymd)
+    final_path = _output_path(output_dir, ymd)
+    try:
+        await _fetch(sem, client, url, final_path)
+        # compress_file is CPU-bound, run it on the process pool so every core is used.
+        # The pool already runs one compression per core, so each one stays single-threaded.
+        compress = functools.partial(compress_file, final_path, threads=1)
+        if not await asyncio.get_running_loop().run_in_executor(pool, compress):
+            final_path.unlink(missing_ok=True)
+            raise RuntimeError(f"compression of {final_path.name} failed")
+        logger.info("✅ Extracted file saved at: %s", existing_output(final_path))
+        return final_path
+    except Exception as e:
+        logger.error("❌ Failed for %s: %s", date_obj.strftime("%d%b%Y").upper(), e)
+        return None
+
+
+async def _download_range(dates: list, output_dir: Path, max_concurrent: int = MAX_CONCURRENT) -> list:
+    """
+    Downloads the bhavcopies for all given (date, YYYYMMDD) pairs concurrently over one shared HTTP/2 client.
+    """
+    sem = asyncio.Semaphore(max_concurrent)
+    limits = httpx.Limits(max_connections=max_concurrent, max_keepalive_connections=max_concurrent)
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+        async with httpx.AsyncClient(http2=h2 is not None, limits=limits, timeout=TIMEOUT,
+                                     headers=HEADERS, follow_redirects=True) as client:
+            results = await asyncio.gather(*[_download_date(sem, client, pool, d, ymd, output_dir) for d, ymd in dates])
+    return [r for r in results if r is not None]
+
+
+def download_bhavcopy_range(start_date: str, end_date: str, output_dir: Union[str, Path],
+                            max_concurrent: int = MAX_CONCURRENT) -> list:
     """
-    Download NSE equity bhavcopies between two dates (inclusive), skipping weekends.
+    Download BSE equity bhavcopies between two dates (inclusive), skipping weekends and exchange holidays
+    (weekend special sessions are included).
+    Up to max_concurrent dates are downloaded in parallel.
 
     :param start_date: Start date in ddMMMyyyy (e.g., "01AUG2025")
     :param end_date: End date in ddMMMyyyy (e.g., "05AUG2025")
     :param output_dir: Directory to store downloaded CSVs
-    :return: List of Paths to downloaded files
+    :param max_concurrent: Maximum number of downloads in flight at once
+    :return: List of Paths to the files downloaded by this call (dates already present are not included)
     """
     start = datetime.strptime(start_date.upper(), "%d%b%Y")
     end = datetime.strptime(end_date.upper(), "%d%b%Y")
 
-    current = start
-    downloaded_files = []
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # Only exchange trading days: weekends and listed holidays are never requested
+    trading_days = CustomBusinessDay(holidays=TRADING_HOLIDAYS)
+    dates = [d.to_pydatetime() for d in pd.bdate_range(start, end, freq=trading_days)]
+    # Weekend special sessions publish a bhavcopy as well
+    specials = (datetime.strptime(d, "%Y-%m-%d") for d in SPECIAL_SESSIONS)
+    dates = sorted(set(dates).union(d for d in specials if start <= d <= end))
+    if start.year < FIRST_LISTED_YEAR or end.year > LAST_LISTED_YEAR:
+        logger.warning("⚠️ Holidays are only listed for %d–%d: other dates are treated as Mon–Fri trading days.",
+                       FIRST_LISTED_YEAR, LAST_LISTED_YEAR)
 
-    while current <= end:
-        if current.weekday() < 5:  # 0–4 = Mon–Fri
-            date_str = current.strftime("%d%b%Y").upper()
-            try:
-                file_path = download_bse_equity_bhavcopy(date_str, output_dir)
-                downloaded_files.append(file_path)
-            except Exception as e:
-                print(f"❌ Failed for {date_str}: {e}")
+    # Dates saved by an earlier run are reported once here and never requested again
+    pending, present = [], 0
+    for date_obj in dates:
+        ymd = date_obj.strftime("%Y%m%d")
+        final_path = _output_path(output_dir, ymd)
+        if existing_output(final_path) is not None:
+            logger.info("⏭️ Already downloaded: %s", final_path)
+            present += 1
         else:
-            print(f"⏭️ Skipping weekend: {current.strftime('%A %d-%b-%Y')}")
-        current += timedelta(days=1)
+            pending.append((date_obj, ymd))
 
-    print(f"✅ Completed. {len(downloaded_files)} files downloaded.")
+    downloaded_files = []
+    if pending:
+        downloaded_files = asyncio.run(_download_range(pending, output_dir, max_concurrent))
+
+    logger.info("✅ Completed. %d files downloaded, %d already present.", len(downloaded_files), present)
     return downloaded_files
 
 
 if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s %(message)s", level=logging.INFO)
+
     # Example usage
     start_date = "01JAN2024"
     end_date = "31DEC2024"
     output_directory = "../data/bse/equity/2024"
 
     downloaded_files = download_bhavcopy_range(start_date, end_date, output_directory)
-    print(f"Downloaded {len(downloaded_files)} files")
\ No newline at end of file
+    logger.info("Downloaded %d files", len(downloaded_files))
\ No newline at end of file
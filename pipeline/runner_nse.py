@@ -1,20 +1,44 @@
 #!/usr/bin/python3
 
-import shutil
-import gzip
-import pickle
+import os
+import functools
+import io
+import time
+import json
+import asyncio
+import logging
+import httpx
 import requests
+import pandas as pd
+from urllib.parse import urlsplit
 from datetime import datetime
 from zipfile import ZipFile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Union
-from datetime import timedelta
+from pandas.tseries.offsets import CustomBusinessDay
+from market_holidays import TRADING_HOLIDAYS, FIRST_LISTED_YEAR, LAST_LISTED_YEAR, SPECIAL_SESSIONS
+import dns_cache
+from compression import COMPRESSION, compressed_path, existing_output, resolve_codec, write_compressed
+from retries import MAX_RETRIES, RETRY_STATUSES, retry_adapter, retry_delay, backoff_delay
+from typing import BinaryIO, Union
+
+try:
+    import h2  # noqa: F401  enables HTTP/2 in httpx
+except ImportError:  # optional, downloads fall back to HTTP/1.1
+    h2 = None
 
 # Configuration
 BASE_URL = "https://nsearchives.nseindia.com"
 cookies_dir = "../data"
 output_dir = "../data/nse/equity/nse"
 TIMEOUT = 20  # seconds
+MAX_CONCURRENT = 10  # parallel downloads in download_bhavcopy_range
+DNS_TTL = 60 * 60  # seconds a resolved exchange address is reused
+DNS_HOSTS = {urlsplit(BASE_URL).hostname, "www.nseindia.com"}  # hosts whose DNS lookups are cached
+ZIP_MAGIC = b"PK\x03\x04"  # first bytes of every bhavcopy archive
+COOKIE_TTL = 30 * 60  # seconds before NSE cookies are fetched again
+
+logger = logging.getLogger(__name__)
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0",
@@ -23,85 +47,101 @@ HEADERS = {
     "Referer": "https://www.nseindia.com"
 }
 
+# Exchange hosts are resolved once per DNS_TTL instead of on every new connection
+dns_cache.install(DNS_HOSTS, DNS_TTL)
+
+# Shared session so consecutive downloads reuse the same connection and cookies
+_SESSION = requests.Session()
+_SESSION.headers.update(HEADERS)
+_ADAPTER = retry_adapter()
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
+
+# In-process cookie cache: (fetched_at, RequestsCookieJar)
+_cookie_cache = None
+
 def get_or_set_cookies(session: requests.Session, cookie_path: Path):
     """
-    Loads cookies from a file if it exists; otherwise, fetches them from the NSE website and saves them.
+    Loads cookies into the session, from memory if they were already loaded in this process, else from
+    a file if it exists; otherwise, fetches them from the NSE website and saves them.
+    Cookies older than COOKIE_TTL are always fetched again.
 
     :param session: The requests.Session object to manage cookies.
     :param cookie_path: The path to the file where cookies are stored or will be saved.
     """
-    if cookie_path.exists():
-        cookies = pickle.loads(cookie_path.read_bytes())
-        session.cookies.update(cookies)
+    global _cookie_cache
+    now = time.time()
+    if _cookie_cache is not None and now - _cookie_cache[0] < COOKIE_TTL:
+        session.cookies.update(_cookie_cache[1])
+        return
+
+    if cookie_path.exists() and now - cookie_path.stat().st_mtime < COOKIE_TTL:
+        cookies = requests.utils.cookiejar_from_dict(json.loads(cookie_path.read_text()))
+        fetched_at = cookie_path.stat().st_mtime
     else:
         response = session.get("https://www.nseindia.com", timeout=TIMEOUT)
         cookies = response.cookies
-        cookie_path.write_bytes(pickle.dumps(cookies))
-        session.cookies.update(cookies)
+        cookie_path.write_text(json.dumps(requests.utils.dict_from_cookiejar(cookies)))
+        fetched_at = now
+    _cookie_cache = (fetched_at, cookies)
+    session.cookies.update(cookies)
    
 
-def download_file(session: requests.Session, url: str, dest_path: Path):
+def download_file(session: requests.Session, url: str, dest: BinaryIO):
     """
-    Downloads a file from a given URL and saves it to a specified path.
+    Downloads a file from a given URL and writes it to a binary file object.
 
     :param session: The requests.Session object to use for the download.
     :param url: The URL of the file to download.
-    :param dest_path: The local path where the downloaded file will be saved.
-    :raises RuntimeError: If the downloaded content is an HTML page, which indicates the file was not found.
+    :param dest: Writable binary file object (e.g. an open file or a BytesIO).
+    :raises requests.HTTPError: If NSE answers with an error status.
+    :raises RuntimeError: If the downloaded content is an HTML page, which indicates the file was not found,
+        or is otherwise not a zip archive.
     """
     response = session.get(url, stream=True, timeout=TIMEOUT)
+    response.raise_for_status()
     if "text/html" in response.headers.get("Content-Type", ""):
         raise RuntimeError(f"NSE file not available or invalid URL: {url}")
 
-    with open(dest_path, "wb") as f:
-        for chunk in response.iter_content(chunk_size=1024 * 1024):
-            f.write(chunk)
+    chunks = response.iter_content(chunk_size=1024 * 1024)
+    first = next(chunks, b"")
+    if not first.startswith(ZIP_MAGIC):
+        raise RuntimeError(f"Not a zip archive: {url} starts with {first[:4]!r}")
+    dest.write(first)
+    for chunk in chunks:
+        dest.write(chunk)
 
 
-def extract_file(file: Path, extract_to: Path) -> Path:
+def compress_zip(archive: Union[Path, BinaryIO], output_path: Path, codec: str = COMPRESSION, level: int = 6,
+                 threads: Union[int, None] = None) -> Path:
     """
-    Extracts the first file from a zip archive, removes the original zip file, and returns the path to the extracted file.
-
-    :param file: The path to the zip file to be extracted.
-    :param extract_to: The directory where the file should be extracted.
-    :return: The path to the newly extracted file.
+    Compresses the first file of a zip archive straight into a .csv.gz / .csv.zst next to output_path,
+    without extracting it to disk first.
+
+    :param archive: The zip archive, as a path or a seekable binary file object.
+    :param output_path: The path of the uncompressed CSV; its suffix is replaced by the codec's extension.
+    :param codec: "gzip" or "zstd"
+    :param level: gzip compression level
+    :param threads: Compressor threads; None uses every core. Pass 1 when already running one compression per core.
+    :return: The path to the compressed file.
     """
-    with ZipFile(file) as zipf:
-        first_file = zipf.namelist()[0]
-        extracted_path = zipf.extract(first_file, path=extract_to)
-    file.unlink()  # Remove zip
-    return Path(extracted_path)
+    codec = resolve_codec(codec)
+    out_path = compressed_path(output_path, codec)
+    with ZipFile(archive) as zipf:
+        member = zipf.infolist()[0]
+        with zipf.open(member) as f_in:
+            write_compressed(f_in, out_path, codec, level, member.file_size, threads)
+    return out_path
 
 
-def compress_file(input_file_path):
-    """
-    Compresses a given file to a .csv.gz format. 
-    The compressed file will have the same name but with a .csv.gz extension in the same directory.
+def _bhavcopy_url(ymd: str) -> str:
+    """Download URL of the bhavcopy for a date formatted as YYYYMMDD."""
+    return f"{BASE_URL}/content/cm/BhavCopy_NSE_CM_0_0_0_{ymd}_F_0000.csv.zip"
 
-    :parm input_file_path (str or Path): The path to the file you want to compress.
-    :return bool                                   
-    """
-    # Ensure the input_file_path is a Path object for easier manipulation
-    input_path = Path(input_file_path)
 
-    # Construct the path for the gzipped file.
-    # It will have the original name with a .csv.gz suffix.
-    gz_path = input_path.with_suffix(".csv.gz")
-
-    try:
-        # Open the input file in binary read mode ('rb')
-        # Open the output gzip file in binary write mode ('wb')
-        with open(input_path, 'rb') as f_in, gzip.open(gz_path, 'wb') as f_out:
-            # Copy the contents from the input file to the gzipped output file
-            shutil.copyfileobj(f_in, f_out)
-        # Optionally remove the uncompressed CSV
-        input_file_path.unlink()  # deletes original .csv file
-        print(f"Successfully compressed '{input_path.name}' to '{gz_path.name}'")
-        return True
-    except FileNotFoundError:
-        print(f"Error: Input file not found at '{input_path}'")
-    except Exception as e:
-        print(f"An error occurred during compression: {e}")
+def _output_path(output_dir: Path, ymd: str) -> Path:
+    """Uncompressed CSV path for a date formatted as YYYYMMDD; the saved file is this path plus .gz or .zst."""
+    return output_dir / f"{ymd}.csv"
 
 
 def download_nse_equity_bhavcopy(date_str: str, output_dir: Union[str, Path]) -> Path:
@@ -112,78 +152,173 @@ def download_nse_equity_bhavcopy(date_str: str, output_dir: Union[str, Path]) ->
     :return: Path to extracted CSV file
     """
     date_obj = datetime.strptime(date_str.upper(), "%d%b%Y")
+    return download_nse_equity_bhavcopy_for_date(date_obj, output_dir)
+
 
+def download_nse_equity_bhavcopy_for_date(date_obj: datetime, output_dir: Union[str, Path]) -> Path:
+    """
+    Same as download_nse_equity_bhavcopy, for a date that is already parsed.
+    :param date_obj: The trading date
+    :param output_dir: Folder to save the extracted CSV
+    :return: Path to extracted CSV file
+    """
     # Ensure output folder
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
     
-    # Setup session and cookies
-    session = requests.Session()
-    session.headers.update(HEADERS)
-    cookie_path = Path(cookies_dir) / "nse_cookies.pkl"
-    get_or_set_cookies(session, cookie_path)
-
     # Download URL and destination
-    zip_filename = f"BhavCopy_NSE_CM_0_0_0_{date_obj:%Y%m%d}_F_0000.csv.zip"
-    zip_url = f"{BASE_URL}/content/cm/{zip_filename}"
-    zip_path = Path(output_dir) / zip_filename
+    ymd = date_obj.strftime("%Y%m%d")
+    zip_url = _bhavcopy_url(ymd)
+    final_path = _output_path(output_dir, ymd)
 
-    # Download and extract
-    download_file(session, zip_url, zip_path)
-    
-    # Extract zip file
-    extracted = extract_file(zip_path, output_dir)
+    # Nothing to do if this date was already saved by an earlier run
+    if existing_output(final_path) is not None:
+        logger.info("⏭️ Already downloaded: %s", final_path)
+        return final_path
 
-    # Rename file
-    # final_filename = date_obj.strftime("%d%b%Y").upper() + ".csv"
-    final_filename = date_obj.strftime("%Y%m%d") + ".csv"
-    final_path = output_dir / final_filename
-    Path(extracted).rename(final_path)
+    # Setup session and cookies
+    cookie_path = Path(cookies_dir) / "nse_cookies.json"
+    get_or_set_cookies(_SESSION, cookie_path)
 
-    # Compress the file to .csv.gz to save space
-    compress_file(final_path)
+    # Download the zip into memory and compress its CSV straight to .csv.gz, without intermediate files.
+    # Equity bhavcopy zips are well under a megabyte, so a BytesIO is enough.
+    buf = io.BytesIO()
+    download_file(_SESSION, zip_url, buf)
+    out_path = compress_zip(buf, final_path)
 
-    print(f"✅ Extracted file saved at: {final_path}.gz")
+    logger.info("✅ Extracted file saved at: %s", out_path)
     return final_path
 
 
-def download_bhavcopy_range(start_date: str, end_date: str, output_dir: Union[str, Path]) -> list:
+async def _fetch(sem: asyncio.Semaphore, client: httpx.AsyncClient, url: str) -> io.BytesIO:
+    """
+    Downloads a single file into memory, holding a slot of the semaphore while the request is in flight.
+
+    :param sem: Semaphore bounding the number of concurrent requests.
+    :param client: Shared httpx client carrying the NSE cookies.
+    :param url: The URL of the file to download.
+    :return: The downloaded bytes as a seekable in-memory file.
+    :raises httpx.HTTPStatusError: If NSE answers with an error status after MAX_RETRIES retries.
+    :raises RuntimeError: If the downloaded content is an HTML page, which indicates the file was not found,
+        or is otherwise not a zip archive.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            async with sem:
+                response = await client.get(url)
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                break
+            delay = retry_delay(response, attempt)
+        except httpx.TransportError:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt)
+        # Wait outside the semaphore so other dates can use the slot meanwhile
+        await asyncio.sleep(delay)
+
+    response.raise_for_status()
+    if "text/html" in response.headers.get("Content-Type", ""):
+        raise RuntimeError(f"NSE file not available or invalid URL: {url}")
+    if not response.content.startswith(ZIP_MAGIC):
+        raise RuntimeError(f"Not a zip archive: {url} starts with {response.content[:4]!r}")
+    return io.BytesIO(response.content)
+
+
+async def _download_date(sem: asyncio.Semaphore, client: httpx.AsyncClient, pool: ProcessPoolExecutor,
+                         date_obj: datetime, ymd: str, output_dir: Path) -> Union[Path, None]:
+    """
+    Downloads the bhavcopy zip for one date and compresses its CSV straight to the output file.
+    Failures are reported and swallowed so that one missing day does not abort the whole range.
+    """
+    zip_url = _bhavcopy_url(ymd)
+    final_path = _output_path(output_dir, ymd)
+    try:
+        archive = await _fetch(sem, client, zip_url)
+        # Compression is CPU-bound, run it on the process pool so every core is used.
+        # The pool already runs one compression per core, so each one stays single-threaded.
+        compress = functools.partial(compress_zip, archive, final_path, threads=1)
+        out_path = await asyncio.get_running_loop().run_in_executor(pool, compress)
+        logger.info("✅ Extracted file saved at: %s", out_path)
+        return final_path
+    except Exception as e:
+        logger.error("❌ Failed for %s: %s", date_obj.strftime("%d%b%Y").upper(), e)
+        return None
+
+
+async def _download_range(dates: list, output_dir: Path, cookies: dict,
+                          max_concurrent: int = MAX_CONCURRENT) -> list:
     """
-    Download NSE equity bhavcopies between two dates (inclusive), skipping weekends.
+    Downloads the bhavcopies for all given (date, YYYYMMDD) pairs concurrently over one shared HTTP/2 client.
+    """
+    sem = asyncio.Semaphore(max_concurrent)
+    limits = httpx.Limits(max_connections=max_concurrent, max_keepalive_connections=max_concurrent)
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+        async with httpx.AsyncClient(http2=h2 is not None, limits=limits, timeout=TIMEOUT,
+                                     headers=HEADERS, cookies=cookies, follow_redirects=True) as client:
+            results = await asyncio.gather(*[_download_date(sem, client, pool, d, ymd, output_dir) for d, ymd in dates])
+    return [r for r in results if r is not None]
+
+
+def download_bhavcopy_range(start_date: str, end_date: str, output_dir: Union[str, Path],
+                            max_concurrent: int = MAX_CONCURRENT) -> list:
+    """
+    Download NSE equity bhavcopies between two dates (inclusive), skipping weekends and exchange holidays
+    (weekend special sessions are included).
+    Up to max_concurrent dates are downloaded in parallel.
 
     :param start_date: Start date in ddMMMyyyy (e.g., "01AUG2025")
     :param end_date: End date in ddMMMyyyy (e.g., "05AUG2025")
     :param output_dir: Directory to store downloaded CSVs
-    :return: List of Paths to downloaded files
+    :param max_concurrent: Maximum number of downloads in flight at once
+    :return: List of Paths to the files downloaded by this call (dates already present are not included)
     """
     start = datetime.strptime(start_date.upper(), "%d%b%Y")
     end = datetime.strptime(end_date.upper(), "%d%b%Y")
 
-    current = start
-    downloaded_files = []
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
 
-    while current <= end:
-        if current.weekday() < 5:  # 0–4 = Mon–Fri
-            date_str = current.strftime("%d%b%Y").upper()
-            try:
-                file_path = download_nse_equity_bhavcopy(date_str, output_dir)
-                downloaded_files.append(file_path)
-            except Exception as e:
-                print(f"❌ Failed for {date_str}: {e}")
+    # Only exchange trading days: weekends and listed holidays are never requested
+    trading_days = CustomBusinessDay(holidays=TRADING_HOLIDAYS)
+    dates = [d.to_pydatetime() for d in pd.bdate_range(start, end, freq=trading_days)]
+    # Weekend special sessions publish a bhavcopy as well
+    specials = (datetime.strptime(d, "%Y-%m-%d") for d in SPECIAL_SESSIONS)
+    dates = sorted(set(dates).union(d for d in specials if start <= d <= end))
+    if start.year < FIRST_LISTED_YEAR or end.year > LAST_LISTED_YEAR:
+        logger.warning("⚠️ Holidays are only listed for %d–%d: other dates are treated as Mon–Fri trading days.",
+                       FIRST_LISTED_YEAR, LAST_LISTED_YEAR)
+
+    # Dates saved by an earlier run are reported once here and never requested again
+    pending, present = [], 0
+    for date_obj in dates:
+        ymd = date_obj.strftime("%Y%m%d")
+        final_path = _output_path(output_dir, ymd)
+        if existing_output(final_path) is not None:
+            logger.info("⏭️ Already downloaded: %s", final_path)
+            present += 1
         else:
-            print(f"⏭️ Skipping weekend: {current.strftime('%A %d-%b-%Y')}")
-        current += timedelta(days=1)
+            pending.append((date_obj, ymd))
+
+    downloaded_files = []
+    if pending:
+        # Seed cookies once and share them across every request of the range
+        get_or_set_cookies(_SESSION, Path(cookies_dir) / "nse_cookies.json")
+        cookies = requests.utils.dict_from_cookiejar(_SESSION.cookies)
 
-    print(f"✅ Completed. {len(downloaded_files)} files downloaded.")
+        downloaded_files = asyncio.run(_download_range(pending, output_dir, cookies, max_concurrent))
+
+    logger.info("✅ Completed. %d files downloaded, %d already present.", len(downloaded_files), present)
     return downloaded_files
 
 
 if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s %(message)s", level=logging.INFO)
+
     # Example usage
     output_dir = "../data/nse/equity/2024"
     start_date = "01JAN2024"
     end_date = "31Dec2024"
     
     downloaded_files = download_bhavcopy_range(start_date, end_date, output_dir)
-    print(f"Downloaded {len(downloaded_files)} files")
+    logger.info("Downloaded %d files", len(downloaded_files))
 